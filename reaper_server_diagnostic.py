@@ -4,14 +4,31 @@ REAPER-Server Connection Diagnostic
 Traces the exact path from REAPER script to server to identify where queries are lost
 """
 
-import sys
 import time
+import re
+import collections
 from xmlrpc.server import SimpleXMLRPCServer
 from xmlrpc.client import ServerProxy
 import threading
-import json
 from datetime import datetime
 
+# one alternation for every token kind the analyzers count, so each string is scanned once
+CA_TOKEN_RE = re.compile(r'([Nwd]):\d+|;(M):\d+|<extra_id_(\d+)>')
+
+
+def scan_ca_tokens(s):
+    """Count N:/w:/d:/;M: instructions in s and collect its extra_ids in one pass"""
+    counts = collections.Counter()
+    extra_ids = []
+    for match in CA_TOKEN_RE.finditer(s):
+        kind, measure, extra_id = match.groups()
+        if extra_id is not None:
+            extra_ids.append(int(extra_id))
+        else:
+            counts[kind or measure] += 1
+    return counts, extra_ids
+
+
 class DiagnosticXMLRPCServer(SimpleXMLRPCServer):
     """Enhanced XML-RPC Server with detailed request tracing"""
     
@@ -87,11 +104,7 @@ class DiagnosticXMLRPCServer(SimpleXMLRPCServer):
         """Analyze the input string for REAPER/CA patterns"""
         print(f"\n📝 INPUT STRING ANALYSIS:")
         
-        # Count extra_id tokens
-        extra_ids = []
-        import re
-        for match in re.finditer(r'<extra_id_(\d+)>', input_str):
-            extra_ids.append(int(match.group(1)))
+        counts, extra_ids = scan_ca_tokens(input_str)
         
         if extra_ids:
             print(f"   Extra ID tokens found: {sorted(set(extra_ids))} (count: {len(extra_ids)})")
@@ -99,16 +112,16 @@ class DiagnosticXMLRPCServer(SimpleXMLRPCServer):
             print(f"   No extra_id tokens found")
         
         # Count note instructions
-        note_count = len(re.findall(r'N:\d+', input_str))
-        wait_count = len(re.findall(r'w:\d+', input_str))
-        duration_count = len(re.findall(r'd:\d+', input_str))
+        note_count = counts['N']
+        wait_count = counts['w']
+        duration_count = counts['d']
         
         print(f"   Note instructions (N:): {note_count}")
         print(f"   Wait instructions (w:): {wait_count}")
         print(f"   Duration instructions (d:): {duration_count}")
         
         # Check for measure markers
-        measure_count = len(re.findall(r';M:\d+', input_str))
+        measure_count = counts['M']
         if measure_count > 0:
             print(f"   Measure markers found: {measure_count}")
         
@@ -147,20 +160,16 @@ class DiagnosticXMLRPCServer(SimpleXMLRPCServer):
         print(f"\n🎼 RESULT ANALYSIS:")
         
         # Count output instructions
-        import re
-        note_count = len(re.findall(r'N:\d+', result_str))
-        wait_count = len(re.findall(r'w:\d+', result_str))
-        duration_count = len(re.findall(r'd:\d+', result_str))
+        counts, extra_ids = scan_ca_tokens(result_str)
+        note_count = counts['N']
+        wait_count = counts['w']
+        duration_count = counts['d']
         
         print(f"   Output notes (N:): {note_count}")
         print(f"   Output waits (w:): {wait_count}")
         print(f"   Output durations (d:): {duration_count}")
         
         # Check for extra_id tokens in output
-        extra_ids = []
-        for match in re.finditer(r'<extra_id_(\d+)>', result_str):
-            extra_ids.append(int(match.group(1)))
-        
         if extra_ids:
             print(f"   Extra ID tokens in output: {sorted(set(extra_ids))}")
         
@@ -185,17 +194,13 @@ def mock_call_nn_infill(s, S, use_sampling=True, min_length=10,
     time.sleep(0.1)
     
     # Generate contextually appropriate response
-    import re
     extra_ids = re.findall(r'<extra_id_(\d+)>', s)
     
     if extra_ids:
         # Infill response - replace tokens with notes
-        result = s
-        for match in re.finditer(r'<extra_id_(\d+)>', s):
-            token = match.group(0)
-            # Generate some notes for this token
-            replacement = "N:60;d:240;w:240;N:64;d:240;w:240;N:67;d:240;w:240"
-            result = result.replace(token, replacement, 1)
+        # Generate the same notes for every token, in a single pass over s
+        replacement = "N:60;d:240;w:240;N:64;d:240;w:240;N:67;d:240;w:240"
+        result = re.sub(r'<extra_id_\d+>', replacement, s)
         
         print(f"   Generated infill response: replaced {len(extra_ids)} tokens")
     else:
@@ -42,30 +42,13 @@ LAST_OUTPUTS = set()
 DEBUG = False
 
 
-def normalize_requests(input_s):
+EXTRA_ID_RE = re.compile(r'<extra_id_[^>]*>')
+MEASURE_RE = re.compile(r';M:[^;]*')
 
-    def norm_extra_id(s):
-        first_loc = s.find('<extra_id_')
-        if first_loc != -1:
-            second_loc = s.find('>', first_loc)
-            s = s[:first_loc] + '<e>' + s[second_loc + 1:]
-            return norm_extra_id(s)
-        else:
-            return s
-
-    def norm_measure(s):
-        first_loc = s.find(';M:')
-        if first_loc != -1:
-            second_loc = s.find(';', first_loc + 1)
-            if second_loc == -1:
-                s = s[:first_loc] + '<M>'
-            else:
-                s = s[:first_loc] + '<M>' + s[second_loc:]
-            return norm_measure(s)
-        else:
-            return s
 
-    return norm_measure(norm_extra_id(input_s))
+def normalize_requests(input_s):
+    """replace every <extra_id_n> with <e> and every ;M:x with <M>, one regex pass each"""
+    return MEASURE_RE.sub('<M>', EXTRA_ID_RE.sub('<e>', input_s))
 
 
 def load_models(task):
@@ -102,25 +85,30 @@ def get_n_measures(s: str):
 
 
 def choose_model_and_tokenizer_infill(s: str, has_fully_masked_inst: bool):
+    """returns M, tokenizer, str_description, and s already encoded by tokenizer (None if it was not needed to
+    choose)"""
     if MODELS[f'unjoined infill'] is None:
-        return MODELS[f'spm infill'], SPM_TOKENIZER, 'spm'
+        return MODELS[f'spm infill'], SPM_TOKENIZER, 'spm', None
     if MODELS[f'spm infill'] is None:
-        return MODELS[f'unjoined infill'], UNJOINED_TOKENIZER, 'unjoined'
+        return MODELS[f'unjoined infill'], UNJOINED_TOKENIZER, 'unjoined', None
 
-    if len(UNJOINED_TOKENIZER.encode(s)) < 1024 and (get_n_measures(s) <= 9 or has_fully_masked_inst):
+    L_unjoined = UNJOINED_TOKENIZER.encode(s)
+    if len(L_unjoined) < 1024 and (get_n_measures(s) <= 9 or has_fully_masked_inst):
         M = MODELS['unjoined infill']
         tokenizer = UNJOINED_TOKENIZER
         str_description = 'unjoined'
+        L = L_unjoined
         if DEBUG:
             print('using unjoined tokenizer and model')
     else:
         M = MODELS['spm infill']
         tokenizer = SPM_TOKENIZER
         str_description = 'spm'
+        L = None
         if DEBUG:
             print('using SPM tokenizer and model')
 
-    return M, tokenizer, str_description
+    return M, tokenizer, str_description, L
 
 
 def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_size=0,
@@ -140,7 +128,7 @@ def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_s
         LAST_OUTPUTS = set()
 
     # choose model to use
-    M, tokenizer, str_tok = choose_model_and_tokenizer_infill(s=s, has_fully_masked_inst=has_fully_masked_inst)
+    M, tokenizer, str_tok, L = choose_model_and_tokenizer_infill(s=s, has_fully_masked_inst=has_fully_masked_inst)
 
     # stretch enc_no_repeat_ngram_size if using unjoined tokenizer
     # if str_tok == 'unjoined' and enc_no_repeat_ngram_size:
@@ -162,7 +150,8 @@ def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_s
 
     # if DEBUG:
     #     print('input: ', s)
-    L = tokenizer.Encode(s)
+    if L is None:  # not already encoded while choosing the model
+        L = tokenizer.Encode(s)
 
     print(f'NN input (len {len(L)})')
 
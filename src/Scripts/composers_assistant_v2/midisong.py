@@ -62,6 +62,7 @@ import copy
 import itertools
 import bisect
 import math
+import operator
 import typing
 import statistics
 
@@ -165,38 +166,28 @@ class Track(object):
 
     def sort_notes(self):
         """in place operation"""
-        # sorts are stable
-        self.notes.sort(key=lambda x: x.end)
-        self.notes.sort(key=lambda x: x.vel)
-        self.notes.sort(key=lambda x: x.pitch)
-        self.notes.sort(key=lambda x: x.click)
+        # one stable sort on a combined key orders exactly like stable sorts by end, vel, pitch, then click
+        self.notes.sort(key=operator.attrgetter('click', 'pitch', 'vel', 'end'))
 
     def sort_note_ons(self):
         """in place operation"""
-        self.note_ons.sort(key=lambda x: x.vel)
-        self.note_ons.sort(key=lambda x: x.pitch)
-        self.note_ons.sort(key=lambda x: x.click)
+        self.note_ons.sort(key=operator.attrgetter('click', 'pitch', 'vel'))
 
     def sort_note_offs(self):
         """in place operation"""
-        self.note_offs.sort(key=lambda x: x.pitch)
-        self.note_offs.sort(key=lambda x: x.click)
+        self.note_offs.sort(key=operator.attrgetter('click', 'pitch'))
 
     def sort_ccs(self):
         """in place operation"""
-        self.ccs.sort(key=lambda x: x.val)
-        self.ccs.sort(key=lambda x: x.cc)
-        self.ccs.sort(key=lambda x: x.click)
+        self.ccs.sort(key=operator.attrgetter('click', 'cc', 'val'))
 
     def sort_pitch_bends(self):
         """in place operation"""
-        self.pitch_bends.sort(key=lambda x: x.val)
-        self.pitch_bends.sort(key=lambda x: x.click)
+        self.pitch_bends.sort(key=operator.attrgetter('click', 'val'))
 
     def sort_pedals(self):
         """in place operation"""
-        self.pedals.sort(key=lambda x: x.end)
-        self.pedals.sort(key=lambda x: x.click)
+        self.pedals.sort(key=operator.attrgetter('click', 'end'))
 
     def sort(self):
         """In place operation. self.notes will be ordered by click, then at a given click by pitch,
@@ -575,9 +566,15 @@ class ByMeasureTrack(object):
                 res[n.noteidx].measure_note_off = i
 
         if measure_lengths is not None:
+            # running totals, so each length is one subtraction instead of a sum over the measures the note spans
+            n_measures = len(measure_lengths)
+            measure_starts = [0]
+            measure_starts.extend(itertools.accumulate(measure_lengths))
             for idx, n in res.items():
                 if n.note_off is not None:
-                    n.length = sum(measure_lengths[n.measure_note_on: n.measure_note_off]) - n.note_on.click + n.note_off.click
+                    lo = min(n.measure_note_on, n_measures)
+                    hi = max(min(n.measure_note_off, n_measures), lo)
+                    n.length = measure_starts[hi] - measure_starts[lo] - n.note_on.click + n.note_off.click
 
         return res
 
@@ -1,22 +1,72 @@
 import sys
 import os
+import atexit
+import shutil
 import tempfile
 import re
 import json
-from xmlrpc.server import SimpleXMLRPCServer
+import array
+import collections
+import functools
+import hashlib
+import io
+import itertools
+import queue
+import socketserver
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 import mido
+import numpy as np
 
-DEBUG = True
+# set MMM_DEBUG=1 to enable verbose logging; off by default so requests skip debug formatting
+DEBUG = os.environ.get('MMM_DEBUG') == '1'
 PORT = 3456
+MSGPACK_PORT = 3457
+
+# single held C4 returned whenever MMM cannot produce an infill
+FALLBACK_CA_TEMPLATE = ";M:0;B:5;L:96;<extra_id_{}>N:60;d:240;w:240"
+FALLBACK_CA = FALLBACK_CA_TEMPLATE.format(0)
+
+# batch variants are converted to CA here while the next variant samples
+IO_POOL = ThreadPoolExecutor(max_workers=2)
+
+# scratch MIDI files live in one per-process directory, in RAM when /dev/shm is available
+TEMP_DIR = tempfile.mkdtemp(prefix='mmm_nn_server_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+atexit.register(shutil.rmtree, TEMP_DIR, ignore_errors=True)
+# released scratch paths are handed out again and overwritten, so steady-state requests
+# neither create nor unlink files; there are only as many as requests ever ran at once
+FREE_TEMP_MIDI_PATHS = queue.SimpleQueue()
+TEMP_MIDI_PATH_COUNTER = itertools.count()
+
+# MMM's python bindings may be built outside site-packages; point MMM_PATH at them
+if 'MMM_PATH' in os.environ:
+    sys.path.insert(0, os.environ['MMM_PATH'])
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../../src/Scripts/composers_assistant_v2'))
 import preprocessing_functions as pre
+import midisong as ms
 
 MMM_AVAILABLE = False
 MODEL = None
 TOKENIZER = None
-LAST_CALL = None
-LAST_OUTPUTS = set()
+# initialize_mmm runs at most once per process, at startup or on the first request
+MMM_INIT_LOCK = threading.Lock()
+MMM_INIT_ATTEMPTED = False
+
+# recent deterministic results, so retries of an identical request skip generation
+RESULT_CACHE_SIZE = 16
+RESULT_CACHE = collections.OrderedDict()
+RESULT_CACHE_LOCK = threading.Lock()
+# cache keys currently being generated -> Event set when that request finishes
+IN_FLIGHT = {}
+
+# requests are served on concurrent threads; only MMM sampling itself is serialized
+GENERATION_LOCK = threading.Lock()
+# at most this many calls decode songs and convert results at once, however many clients connect;
+# the rest wait for a slot, so a burst cannot hold every request's song and Score in memory together
+MAX_ACTIVE_REQUESTS = int(os.environ.get('MMM_MAX_ACTIVE_REQUESTS', '4'))
+ACTIVE_REQUESTS = threading.BoundedSemaphore(MAX_ACTIVE_REQUESTS)
 
 try:
     from mmm import Model, Tokenizer, PromptConfig, SamplingEngine, GenerationConfig, Score, generate, ModelConfig
@@ -25,6 +75,31 @@ try:
 except ImportError as e:
     print(f"MMM library not available: {e}")
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+def ensure_mmm_initialized():
+    """True once MODEL and TOKENIZER are loaded; loads them on first use and never retries a failed load"""
+    global MMM_INIT_ATTEMPTED
+    
+    if not MMM_INIT_ATTEMPTED:
+        with MMM_INIT_LOCK:
+            if not MMM_INIT_ATTEMPTED:
+                initialize_mmm()
+                MMM_INIT_ATTEMPTED = True
+    
+    return MODEL is not None and TOKENIZER is not None
+
 
 def initialize_mmm():
     global MODEL, TOKENIZER
@@ -59,50 +134,62 @@ def initialize_mmm():
         return False
 
 
-def parse_measures_with_extra_ids(s, start_measure, end_measure, debug=False):
+# measure markers, extra_id masks and instrument markers in a CA string
+CA_STRUCTURE_RE = re.compile(r';M:\d+|<extra_id_(\d+)>|;I:(\d+)')
+
+
+def scan_ca_structure(s):
     """
-    Parse CA string to find measures and tracks with extra_ids.
+    One scan over a CA string.
+    
+    Returns:
+        extra_ids: every extra_id in s, in order
+        sections: [first extra_id, first ;I: track] for each ;M: section, None where absent
+    """
+    extra_ids = []
+    sections = []
+    for match in CA_STRUCTURE_RE.finditer(s):
+        extra_id, track = match.group(1), match.group(2)
+        if extra_id is None and track is None:
+            sections.append([None, None])
+        elif extra_id is not None:
+            extra_id = int(extra_id)
+            extra_ids.append(extra_id)
+            if sections and sections[-1][0] is None:
+                sections[-1][0] = extra_id
+        elif sections and sections[-1][1] is None:
+            sections[-1][1] = int(track)
+    return extra_ids, sections
+
+
+def parse_measures_with_extra_ids(sections, start_measure, end_measure, debug=False):
+    """
+    Map the sections from scan_ca_structure onto project measures.
     
     Returns:
         marked_measures: set of measure indices
         extra_id_to_measure: dict mapping extra_id -> measure
         extra_id_to_track: dict mapping extra_id -> track_idx
     """
-    if debug:
-        print('  CA string preview:', s[:200] if len(s) > 200 else s)
-    
     marked_measures = set()
     extra_id_to_measure = {}
     extra_id_to_track = {}
     
-    measure_starts = []
-    for match in re.finditer(r';M:\d+', s):
-        measure_starts.append(match.start())
-    
-    if not measure_starts:
+    if not sections:
         if debug:
             print("  No measure markers found in CA string")
         return marked_measures, extra_id_to_measure, extra_id_to_track
     
     if debug:
-        print(f"  Found {len(measure_starts)} measure markers in CA string")
+        print(f"  Found {len(sections)} measure markers in CA string")
     
     # Process each section
-    for i in range(len(measure_starts)):
-        section_start = measure_starts[i]
-        section_end = measure_starts[i + 1] if i + 1 < len(measure_starts) else len(s)
-        section_text = s[section_start:section_end]
-        
-        # Check if this section has an extra_id
-        extra_id_match = re.search(r'<extra_id_(\d+)>', section_text)
-        if not extra_id_match:
+    for i, (extra_id, track_idx) in enumerate(sections):
+        if extra_id is None:
             continue
         
-        extra_id = int(extra_id_match.group(1))
-        
-        # Extract track index from I: marker
-        track_match = re.search(r';I:(\d+)', section_text)
-        track_idx = int(track_match.group(1)) if track_match else 0
+        if track_idx is None:
+            track_idx = 0
         
         project_measure = start_measure + i
         
@@ -119,8 +206,13 @@ def parse_measures_with_extra_ids(s, start_measure, end_measure, debug=False):
     return marked_measures, extra_id_to_measure, extra_id_to_track
 
 
-def detect_measures_to_generate(S, s, start_measure, end_measure, has_extra_ids, debug=False):
-    measures_to_generate = set()
+def detect_measures_to_generate(sections, start_measure, end_measure, has_extra_ids, debug=False):
+    """
+    Work out what to generate from the CA string's structure and the selection alone; S is not needed,
+    so a request with nothing to infill can be answered before the song is decoded or the model loaded.
+    measures_to_generate is returned as an ascending list, so nothing downstream has to sort it again.
+    """
+    measures_to_generate = []
     extra_id_to_measure = {}
     extra_id_to_track = {}
     
@@ -136,11 +228,11 @@ def detect_measures_to_generate(S, s, start_measure, end_measure, has_extra_ids,
     
     if has_extra_ids:
         marked_measures, extra_id_to_measure, extra_id_to_track = parse_measures_with_extra_ids(
-            s, start_measure, end_measure, debug
+            sections, start_measure, end_measure, debug
         )
-        measures_to_generate = marked_measures
+        measures_to_generate = sorted(marked_measures)
         if debug:
-            print(f"  Marked measures: {sorted(marked_measures)}")
+            print(f"  Marked measures: {measures_to_generate}")
             print(f"  Extra_id mapping: {extra_id_to_measure}")
             print(f"  Track mapping: {extra_id_to_track}")
     else:
@@ -148,7 +240,7 @@ def detect_measures_to_generate(S, s, start_measure, end_measure, has_extra_ids,
             print("  No extra_ids, nothing to generate")
     
     if debug:
-        print(f"  Will generate: {sorted(measures_to_generate)}")
+        print(f"  Will generate: {measures_to_generate}")
     
     return measures_to_generate, extra_id_to_measure, extra_id_to_track
 
@@ -158,36 +250,32 @@ def build_track_specific_bar_mode(S, measures_to_generate, extra_id_to_measure,
     Build bar_mode dictionary with track-specific infill ranges.
     When extra_id tokens are present, include those measures EVEN IF they have content,
     because the user explicitly wants to regenerate them.
+    measures_to_generate is the ascending list from detect_measures_to_generate,
+    so each track's measures come out in order.
     """
     bar_mode = {"bars": {}}
     
     if not measures_to_generate:
         return bar_mode
     
-    # Build reverse mapping: measure -> extra_id
+    # Build reverse mapping: measure -> track of the extra_id marking it
     measure_to_extra_id = {v: k for k, v in extra_id_to_measure.items()}
+    extra_id_track_by_measure = {m: extra_id_to_track.get(eid) for m, eid in measure_to_extra_id.items()}
     
     # Check each track in S to see which measures need generation
     track_to_measures = {}
     
     for track_idx, track in enumerate(S.tracks):
+        tracks_by_measure = track.tracks_by_measure
+        n_track_measures = len(tracks_by_measure)
         track_measures = []
         for measure_idx in measures_to_generate:
             # CRITICAL: Include measure if it has an extra_id token for this track
             # This handles the case where user wants to REPLACE existing content
-            has_extra_id_for_this_track = (
-                measure_idx in measure_to_extra_id and
-                extra_id_to_track.get(measure_to_extra_id[measure_idx]) == track_idx
-            )
+            has_extra_id_for_this_track = extra_id_track_by_measure.get(measure_idx) == track_idx
             
             # Check if this measure is empty in this track
-            is_empty = False
-            if measure_idx >= len(track.tracks_by_measure):
-                is_empty = True
-            else:
-                measure_track = track.tracks_by_measure[measure_idx]
-                if not (hasattr(measure_track, 'note_ons') and measure_track.note_ons):
-                    is_empty = True
+            is_empty = measure_idx >= n_track_measures or not tracks_by_measure[measure_idx].note_ons
             
             # Include measure if it's empty OR has an extra_id for this track
             if is_empty or has_extra_id_for_this_track:
@@ -201,15 +289,10 @@ def build_track_specific_bar_mode(S, measures_to_generate, extra_id_to_measure,
     if debug:
         print(f"  Track-to-measures mapping:")
         for track_idx, measures in sorted(track_to_measures.items()):
-            print(f"    Track {track_idx}: {sorted(measures)}")
+            print(f"    Track {track_idx}: {measures}")
     
     # Build ranges for each track
-    for track_idx, track_measures in track_to_measures.items():
-        if not track_measures:
-            continue
-        
-        sorted_measures = sorted(track_measures)
-        
+    for track_idx, sorted_measures in track_to_measures.items():
         # Group into contiguous ranges
         ranges = []
         range_start = sorted_measures[0]
@@ -235,29 +318,129 @@ def build_track_specific_bar_mode(S, measures_to_generate, extra_id_to_measure,
     return bar_mode
 
 
-def convert_midi_to_ca_format_with_timing(midi_path, project_measures, measures_to_generate, 
+# one row per extracted note, in file ticks; track is the index of the source track in the reader
+NOTE_DTYPE = np.dtype([('pitch', 'u1'), ('start', 'i4'), ('duration', 'i4'), ('velocity', 'u1'), ('track', 'u2')])
+
+
+def _note_array(track_idx, pitch, start, duration, velocity):
+    notes = np.empty(len(pitch), dtype=NOTE_DTYPE)
+    notes['pitch'] = pitch
+    notes['start'] = start
+    notes['duration'] = duration
+    notes['velocity'] = velocity
+    notes['track'] = track_idx
+    return notes
+
+
+def _track_notes_mido(track, track_idx):
+    """Pair note-ons with note-offs in one mido track, in the order the notes end.
+    A note-on for a pitch that is already sounding restarts it; unmatched note-offs are ignored.
+    Also returns the track's first time signature as (numerator, denominator), or None."""
+    # one pass over the messages into typed buffers, no per-event tuples
+    delta_times = array.array('q')
+    msg_idx = array.array('q')
+    pitch = array.array('B')
+    velocity = array.array('B')
+    is_on = array.array('B')
+    # bound once, since they run for every message
+    add_delta, add_idx, add_pitch, add_velocity, add_on = (
+        delta_times.append, msg_idx.append, pitch.append, velocity.append, is_on.append)
+    time_sig = None
+    for i, msg in enumerate(track):
+        add_delta(msg.time)
+        # meta events (tempo, text, time signature...) fail one class identity check instead of the type strings
+        if msg.__class__ is not mido.Message:
+            if time_sig is None and msg.type == 'time_signature':
+                time_sig = (msg.numerator, msg.denominator)
+            continue
+        msg_type = msg.type
+        if msg_type == 'note_on' or msg_type == 'note_off':
+            add_idx(i)
+            add_pitch(msg.note)
+            msg_velocity = msg.velocity
+            add_velocity(msg_velocity)
+            add_on(msg_type == 'note_on' and msg_velocity > 0)
+    if not msg_idx:
+        return np.empty(0, dtype=NOTE_DTYPE), time_sig
+    
+    abs_times = np.cumsum(np.frombuffer(delta_times, dtype=np.int64))
+    msg_idx = np.frombuffer(msg_idx, dtype=np.int64)
+    pitch = np.frombuffer(pitch, dtype=np.uint8)
+    velocity = np.frombuffer(velocity, dtype=np.uint8)
+    is_on = np.frombuffer(is_on, dtype=np.bool_)
+    
+    # group events by pitch, in message order within each pitch
+    order = np.lexsort((msg_idx, pitch))
+    msg_idx, pitch, velocity, is_on = msg_idx[order], pitch[order], velocity[order], is_on[order]
+    
+    # a note-off ends a note exactly when the previous event on its pitch is a note-on
+    off = np.flatnonzero(~is_on[1:] & is_on[:-1] & (pitch[1:] == pitch[:-1])) + 1
+    off = off[np.argsort(msg_idx[off], kind='stable')]
+    on = off - 1
+    
+    starts = abs_times[msg_idx[on]]
+    return _note_array(track_idx, pitch[on], starts, abs_times[msg_idx[off]] - starts, velocity[on]), time_sig
+
+
+def extract_notes_from_midi(midi_data):
+    """
+    Read every note from the bytes of a MIDI file.
+    
+    Returns:
+        ticks_per_beat: resolution of the file
+        time_signature: (numerator, denominator) of the first time signature, (4, 4) if none
+        notes: NOTE_DTYPE array, in the order notes end
+    """
+    # clip out-of-range data bytes instead of failing the whole conversion on them
+    midi_file = mido.MidiFile(file=io.BytesIO(midi_data), clip=True)
+    
+    # the time signature is picked up in the same walk as the notes, not in a separate scan
+    per_track = [_track_notes_mido(track, track_idx) for track_idx, track in enumerate(midi_file.tracks)]
+    time_sig = next((track_sig for _, track_sig in per_track if track_sig is not None), (4, 4))
+    notes = np.concatenate([np.empty(0, dtype=NOTE_DTYPE)] + [track_notes for track_notes, _ in per_track])
+    
+    return midi_file.ticks_per_beat, time_sig, notes
+
+
+def compute_note_groups(notes, measure_length):
+    """
+    Order NOTE_DTYPE records for CA output and lay them out by measure.
+    
+    Returns:
+        notes: the records sorted by (start, pitch); the sort is stable, so ties keep file order
+        waits: ticks from the previous note in the same measure, or from the barline, to each note
+        measure_slices: dict mapping each measure that has notes to its [lo, hi) slice of notes
+    """
+    # start already determines the measure, so one composite key replaces a (measure, position, pitch) lexsort
+    order = np.argsort(notes['start'].astype(np.int64) * 256 + notes['pitch'], kind='stable')
+    notes = notes[order]
+    measures = notes['start'] // measure_length
+    positions = notes['start'] - measures * measure_length
+    
+    waits = np.diff(positions, prepend=0)
+    first_in_measure = np.ones(len(notes), dtype=bool)
+    first_in_measure[1:] = measures[1:] != measures[:-1]
+    waits[first_in_measure] = positions[first_in_measure]
+    
+    group_starts = np.flatnonzero(first_in_measure)
+    group_ends = np.append(group_starts[1:], len(notes))
+    measure_slices = dict(zip(measures[group_starts].tolist(), zip(group_starts.tolist(), group_ends.tolist())))
+    
+    return notes, waits, measure_slices
+
+
+def convert_midi_to_ca_format_with_timing(midi_data, n_project_measures, measures_to_generate, 
                                           extra_id_to_measure, input_ticks_per_beat=None, 
                                           input_time_signature=None):
     if DEBUG:
         print(f"\n=== CA FORMAT CONVERSION ===")
-        print(f"  MIDI: {midi_path}")
-        print(f"  Project measures: {project_measures}")
-        print(f"  Measures to generate: {sorted(measures_to_generate)}")
+        print(f"  MIDI: {len(midi_data)} bytes")
+        print(f"  Project measures: {n_project_measures}")
+        print(f"  Measures to generate: {measures_to_generate}")
         print(f"  Extra_id mapping: {extra_id_to_measure}")
     
-    midi_file = mido.MidiFile(midi_path)
-    output_ticks_per_beat = midi_file.ticks_per_beat
-    
-    output_time_sig_num = 4
-    output_time_sig_denom = 4
-    for track in midi_file.tracks:
-        for msg in track:
-            if msg.type == 'time_signature':
-                output_time_sig_num = msg.numerator
-                output_time_sig_denom = msg.denominator
-                break
-        if output_time_sig_num != 4:
-            break
+    output_ticks_per_beat, output_time_sig, raw_notes = extract_notes_from_midi(midi_data)
+    output_time_sig_num, output_time_sig_denom = output_time_sig
     
     if input_ticks_per_beat and input_time_signature:
         ticks_per_beat = input_ticks_per_beat
@@ -267,108 +450,179 @@ def convert_midi_to_ca_format_with_timing(midi_path, project_measures, measures_
         time_sig_num = output_time_sig_num
         time_sig_denom = output_time_sig_denom
     
-    timing_ratio = 1.0
-    if input_ticks_per_beat and output_ticks_per_beat != input_ticks_per_beat:
-        timing_ratio = input_ticks_per_beat / output_ticks_per_beat
-        if DEBUG:
-            print(f"  Timing conversion: {output_ticks_per_beat} → {input_ticks_per_beat} (ratio {timing_ratio})")
+    rescale = bool(input_ticks_per_beat) and output_ticks_per_beat != input_ticks_per_beat
+    if rescale and DEBUG:
+        print(f"  Timing conversion: {output_ticks_per_beat} → {input_ticks_per_beat} "
+              f"(ratio {input_ticks_per_beat / output_ticks_per_beat})")
     
-    beats_per_measure = time_sig_num * (4.0 / time_sig_denom)
-    measure_length = int(ticks_per_beat * beats_per_measure)
+    # tick math stays in integers, so no ratio or measure length picks up float rounding error
+    measure_length = ticks_per_beat * 4 * time_sig_num // time_sig_denom
     
     if DEBUG:
         print(f"  Timing: {ticks_per_beat} ticks/beat, {time_sig_num}/{time_sig_denom}")
         print(f"  Measure length: {measure_length} ticks")
     
-    all_notes = []
-    for track_idx, track in enumerate(midi_file.tracks):
-        current_time = 0
-        active_notes = {}
-        
-        for msg in track:
-            current_time += msg.time
-            
-            if msg.type == 'note_on' and msg.velocity > 0:
-                active_notes[msg.note] = {'start': current_time, 'velocity': msg.velocity}
-            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                if msg.note in active_notes:
-                    note_start = active_notes[msg.note]['start']
-                    note_duration = current_time - note_start
-                    
-                    converted_start = int(note_start * timing_ratio)
-                    converted_duration = int(note_duration * timing_ratio)
-                    
-                    all_notes.append({
-                        'pitch': msg.note,
-                        'start': converted_start,
-                        'duration': converted_duration,
-                        'velocity': active_notes[msg.note]['velocity']
-                    })
-                    del active_notes[msg.note]
+    notes = raw_notes
+    n_notes = len(notes)
+    
+    if rescale:
+        # exact int(tick * input / output) in one vectorized pass; int64 so the product cannot overflow
+        notes = notes.copy()
+        notes['start'] = notes['start'].astype(np.int64) * input_ticks_per_beat // output_ticks_per_beat
+        notes['duration'] = notes['duration'].astype(np.int64) * input_ticks_per_beat // output_ticks_per_beat
     
     if DEBUG:
-        print(f"  Extracted {len(all_notes)} notes from MIDI")
+        print(f"  Extracted {n_notes} notes from MIDI")
+        n_bad = np.count_nonzero((notes['pitch'] > 127) | (notes['duration'] <= 0))
+        if n_bad:
+            print(f"  Warning: {n_bad} notes with out-of-range pitch or non-positive duration")
     
-    notes_by_measure = {m: [] for m in measures_to_generate}
-    
-    for note in all_notes:
-        measure_idx = note['start'] // measure_length
-        
-        if measure_idx in measures_to_generate:
-            position_in_measure = note['start'] - (measure_idx * measure_length)
-            notes_by_measure[measure_idx].append({
-                'pitch': note['pitch'],
-                'position': position_in_measure,
-                'duration': note['duration'],
-                'velocity': note['velocity']
-            })
+    notes, waits, measure_slices = compute_note_groups(notes, measure_length)
     
     measure_to_extra_id = {m: eid for eid, m in extra_id_to_measure.items()}
     
-    sections = []
-    for measure in sorted(measures_to_generate):
-        notes = notes_by_measure[measure]
-        
+    # every token is written with its leading ";" into one ASCII buffer, so there is no list to join
+    buf = bytearray()
+    n_sections = 0
+    note_count = 0
+    # ascending already, as returned by detect_measures_to_generate
+    for measure in measures_to_generate:
         if measure not in measure_to_extra_id:
             if DEBUG:
                 print(f"  Warning: measure {measure} has no extra_id mapping, skipping")
             continue
         
         extra_id = measure_to_extra_id[measure]
-        notes.sort(key=lambda n: (n['position'], n['pitch']))
-        
-        note_tokens = []
-        last_position_in_measure = 0
+        lo, hi = measure_slices.get(measure, (0, 0))
+        note_count += hi - lo
         
-        for note in notes:
-            position_in_measure = note['position']
-            wait = position_in_measure - last_position_in_measure
+        buf += b";<extra_id_%d>" % extra_id
+        n_sections += 1
+        for wait, pitch, duration in zip(waits[lo:hi].tolist(), notes['pitch'][lo:hi].tolist(),
+                                         notes['duration'][lo:hi].tolist()):
             if wait > 0:
-                note_tokens.append(f"w:{int(wait)}")
-            
-            note_tokens.append(f"N:{note['pitch']}")
-            note_tokens.append(f"d:{int(note['duration'])}")
-            
-            last_position_in_measure = position_in_measure
-        
-        section = f"<extra_id_{extra_id}>;" + ';'.join(note_tokens)
-        sections.append(section)
+                buf += b";w:%d;N:%d;d:%d" % (wait, pitch, duration)
+            else:
+                buf += b";N:%d;d:%d" % (pitch, duration)
     
-    result = ';' + ';'.join(sections)
+    # empty measures add nothing, so there are no ";;" runs; a request with no mapped measures still gets ";"
+    result = buf.decode('ascii') or ';'
     
     if DEBUG:
         print(f"  Generated CA format: {len(result)} chars")
-        print(f"  Sections: {len(sections)} (one per measure)")
-        note_count = sum(len(notes) for notes in notes_by_measure.values())
+        print(f"  Sections: {n_sections} (one per measure)")
         print(f"  Total notes: {note_count}")
     
     return result
 
 
-def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_size=0, 
-                   has_fully_masked_inst=False, options_dict=None, start_measure=None, end_measure=None):
-    global LAST_CALL, LAST_OUTPUTS
+def get_dumped_midi_header(S):
+    """
+    Ticks per beat and first time signature of the MIDI file S.dump() writes,
+    computed from S directly instead of parsing the dumped file back in.
+    """
+    time_sigs = ms.compute_time_signatures_from_measure_endpoints(
+        measure_endpoints=S.get_measure_endpoints(make_copy=False), cpq=S.cpq
+    )
+    if not time_sigs:
+        return S.cpq, (4, 4)
+    return S.cpq, (time_sigs[0].num, time_sigs[0].denom)
+
+
+def acquire_temp_midi_path():
+    """A .mid path in TEMP_DIR that no other request is using; saving to it overwrites what was there"""
+    try:
+        return FREE_TEMP_MIDI_PATHS.get_nowait()
+    except queue.Empty:
+        return os.path.join(TEMP_DIR, f'scratch_{next(TEMP_MIDI_PATH_COUNTER)}.mid')
+
+
+def release_temp_midi_path(path):
+    FREE_TEMP_MIDI_PATHS.put(path)
+
+
+def song_from_payload(payload):
+    """
+    Rebuild S from the xmlrpc Binary that rpr_mmm_functions sends: the JSON-encoded
+    save dict as one base64 blob, which marshals far faster than a nested <struct>.
+    The msgpack endpoint delivers the save dict packed on its own as msgpack bytes
+    (or, from older clients, the dict itself, already decoded).
+    """
+    if isinstance(payload, dict):
+        return pre.midisongbymeasure_from_save_dict(payload)
+    
+    if isinstance(payload, bytes):
+        return pre.midisongbymeasure_from_save_dict(msgpack.unpackb(payload, raw=False))
     
+    data = payload.data
+    d = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+    return pre.midisongbymeasure_from_save_dict(d)
+
+
+def result_cache_key(s, S, use_sampling, temperature, model_dim, sampling_seed, start_measure, end_measure):
+    """
+    Hash of everything that determines the output of a request, or None when the request
+    samples without a fixed seed and so must never be answered from RESULT_CACHE.
+    """
+    if use_sampling and sampling_seed < 0:
+        return None
+    
+    # hash the song as it arrived; only a bare dict has to be serialized first
+    if isinstance(S, bytes):
+        song_bytes = S
+    elif isinstance(S, dict):
+        song_bytes = orjson.dumps(S) if ORJSON_AVAILABLE else json.dumps(S).encode('utf-8')
+    else:
+        song_bytes = S.data
+    
+    h = hashlib.blake2b(digest_size=16)
+    h.update(s.encode('utf-8'))
+    h.update(b'|')
+    h.update(song_bytes)
+    h.update(repr((bool(use_sampling), temperature, model_dim, sampling_seed, start_measure, end_measure)).encode())
+    return h.digest()
+
+
+def claim_cache_key(cache_key):
+    """
+    Return the cached CA string for cache_key, waiting first if another thread is generating
+    the same request. Returns None when there is no result yet; the caller then owns cache_key
+    and must call release_cache_key once it is done, whether or not it stored a result.
+    """
+    if cache_key is None:
+        return None
+    while True:
+        with RESULT_CACHE_LOCK:
+            if cache_key in RESULT_CACHE:
+                RESULT_CACHE.move_to_end(cache_key)
+                return RESULT_CACHE[cache_key]
+            pending = IN_FLIGHT.get(cache_key)
+            if pending is None:
+                IN_FLIGHT[cache_key] = threading.Event()
+                return None
+        pending.wait()
+
+
+def release_cache_key(cache_key):
+    if cache_key is None:
+        return
+    with RESULT_CACHE_LOCK:
+        finished = IN_FLIGHT.pop(cache_key, None)
+    if finished is not None:
+        finished.set()
+
+
+def store_result(cache_key, ca_result):
+    if cache_key is None:
+        return
+    with RESULT_CACHE_LOCK:
+        RESULT_CACHE[cache_key] = ca_result
+        if len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+            RESULT_CACHE.popitem(last=False)
+
+
+def read_infill_options(options_dict):
+    """Unpack the generation settings REAPER sends, clamping temperature to the range MMM handles well."""
     if options_dict is None:
         options_dict = {}
     
@@ -383,6 +637,169 @@ def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_s
     elif temperature > 2.0:
         temperature = 2.0
     
+    return temperature, model_dim, max_steps, shuffle, sampling_seed
+
+
+@functools.lru_cache(maxsize=8)
+def empty_prompt_config(context_length):
+    """PromptConfig with no bars to infill; it only varies with context_length, so it is built once per value"""
+    return PromptConfig({}, context_length=context_length)
+
+
+def build_prompt_config(S, measures_to_generate, extra_id_to_measure, extra_id_to_track, context_length,
+                        start_measure=None, end_measure=None):
+    if DEBUG:
+        print(f"\n=== BUILDING PROMPT CONFIG ===")
+        print(f"  REAPER selection: measures {start_measure}-{end_measure}")
+        print(f"  Total measures in score: {S.get_n_measures()}")
+        print(f"  Context length: {context_length} bars (on each side of target)")
+        print(f"  Measures to infill: {measures_to_generate}")
+    
+    # Build track-specific bar mode
+    bar_mode = build_track_specific_bar_mode(
+        S, measures_to_generate, extra_id_to_measure, extra_id_to_track, debug=DEBUG
+    )
+    
+    if not bar_mode["bars"]:
+        if DEBUG:
+            print("  No tracks need infilling, using empty config")
+        prompt_cfg = empty_prompt_config(context_length)
+    else:
+        if DEBUG:
+            print(f"  Total tracks in score: {len(S.tracks)}")
+            print(f"  Tracks configured for infilling: {len(bar_mode['bars'])}")
+            for track_idx, ranges in bar_mode["bars"].items():
+                print(f"    Track {track_idx}: {ranges}")
+        
+        prompt_cfg = PromptConfig(bar_mode, context_length=context_length)
+    
+    return prompt_cfg
+
+
+@functools.lru_cache(maxsize=32)
+def generation_config(use_sampling, temperature):
+    """GenerationConfig for these sampling options, built once and reused across requests"""
+    return GenerationConfig(
+        do_sample=use_sampling,
+        max_new_tokens=256,
+        attempts=4,
+        pad_token_id=0,
+        repetition_penalty=1.0,
+        temperature=temperature,
+        top_k=50,
+        top_p=1.0,
+    )
+
+
+def generate_score(score_obj, prompt_cfg, use_sampling, temperature, sampling_seed):
+    gen_cfg = generation_config(use_sampling, temperature)
+    
+    if DEBUG:
+        print(f"\n=== MMM GENERATION ===")
+        print(f"  Context length: {prompt_cfg.context_length} bars")
+        print(f"  Temperature: {temperature}")
+        print(f"  Max tokens: {gen_cfg.max_new_tokens}")
+        print(f"  PromptConfig:")
+        print(f"    Mode: {'BarInfilling' if prompt_cfg.bar_infilling() else 'Other'}")
+        print(f"    Empty: {prompt_cfg.empty()}")
+        if prompt_cfg.bar_infilling() and not prompt_cfg.empty():
+            bars_dict = prompt_cfg.bars()
+            print(f"    Tracks configured: {len(bars_dict)}")
+            for track_idx, ranges in bars_dict.items():
+                print(f"      Track {track_idx}: {ranges}")
+    
+    try:
+        # one request samples at a time; parsing and CA conversion of others run meanwhile
+        with GENERATION_LOCK:
+            engine = SamplingEngine(gen_cfg, TOKENIZER, seed=sampling_seed, verbose=DEBUG)
+            generated_score = generate(
+                model=MODEL,
+                tokenizer=TOKENIZER,
+                prompt_config=prompt_cfg,
+                sampling_engine=engine,
+                score=score_obj,
+                verbose=bool(DEBUG)
+            )
+    except Exception as gen_error:
+        if DEBUG:
+            print(f"\n=== GENERATION ERROR ===")
+            print(f"  Error: {gen_error}")
+            import traceback
+            traceback.print_exc()
+        raise
+    
+    return generated_score
+
+
+def warm_up_mmm():
+    """
+    Sample one bar of a tiny two-bar score, so the first REAPER request does not also pay
+    for the inference runtime's first-run setup. A failure here is reported and otherwise ignored.
+    """
+    midi_path = acquire_temp_midi_path()
+    try:
+        midi_file = mido.MidiFile(ticks_per_beat=480)
+        track = mido.MidiTrack([
+            mido.Message('note_on', note=60, velocity=80, time=0),
+            mido.Message('note_off', note=60, velocity=0, time=1920),
+            mido.MetaMessage('end_of_track', time=1920),
+        ])
+        midi_file.tracks.append(track)
+        midi_file.save(midi_path)
+        
+        prompt_cfg = PromptConfig({"bars": {0: [(1, 2, [])]}}, context_length=1)
+        generate_score(Score(midi_path), prompt_cfg, use_sampling=False, temperature=1.0, sampling_seed=0)
+        return True
+    except Exception as e:
+        print(f"Warning: MMM warm-up failed: {e}")
+        return False
+    finally:
+        release_temp_midi_path(midi_path)
+
+
+def generated_score_to_ca(generated_score, result_midi_path, n_project_measures, measures_to_generate,
+                          extra_id_to_measure, input_ticks_per_beat, input_time_sig):
+    try:
+        generated_score.save(result_midi_path)
+    except Exception as save_error:
+        if DEBUG:
+            print(f"  Error saving score: {save_error}")
+        raise
+    
+    # read the file once; the notes are parsed from these bytes rather than from the path again
+    try:
+        with open(result_midi_path, 'rb') as f:
+            midi_data = f.read()
+    except OSError:
+        if DEBUG:
+            print(f"  ERROR: Generated MIDI file does not exist")
+        raise FileNotFoundError("Generated MIDI file not created")
+    
+    if not midi_data:
+        if DEBUG:
+            print(f"  ERROR: Generated MIDI file is empty")
+        raise ValueError("Generated MIDI file is empty")
+    
+    if DEBUG:
+        print(f"  Generation complete, saved to {result_midi_path}")
+        print(f"  File size: {len(midi_data)} bytes")
+    
+    ca_result = convert_midi_to_ca_format_with_timing(
+        midi_data,
+        n_project_measures,
+        measures_to_generate,
+        extra_id_to_measure,
+        input_ticks_per_beat=input_ticks_per_beat,
+        input_time_signature=input_time_sig
+    )
+    
+    return ca_result
+
+
+def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_size=0, 
+                   has_fully_masked_inst=False, options_dict=None, start_measure=None, end_measure=None):
+    temperature, model_dim, max_steps, shuffle, sampling_seed = read_infill_options(options_dict)
+    
     if DEBUG:
         print(f"\n{'='*60}")
         print('MMM CALL_NN_INFILL')
@@ -391,187 +808,264 @@ def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_s
         print(f"  Max steps: {max_steps}")
         print(f"  Shuffle: {shuffle}")
     
+    cache_key = None
     try:
-        if not MMM_AVAILABLE or MODEL is None or TOKENIZER is None:
+        if not MMM_AVAILABLE:
             if DEBUG:
                 print("  MMM not available, returning fallback")
-            return ";M:0;B:5;L:96;<extra_id_0>N:60;d:240;w:240"
+            return FALLBACK_CA
         
-        s_normalized = re.sub(r'<extra_id_\d+>', '<extra_id_0>', s)
-        
-        extra_ids = [int(m) for m in re.findall(r'<extra_id_(\d+)>', s)]
+        extra_ids, sections = scan_ca_structure(s)
         actual_extra_id = extra_ids[0] if extra_ids else 0
         
-        if isinstance(S, dict):
-            S = pre.midisongbymeasure_from_save_dict(S)
-        
-        project_measures = list(range(S.get_n_measures()))
-        
         if DEBUG:
+            print('  CA string preview:', s[:200] if len(s) > 200 else s)
             print(f"  Extra IDs: {extra_ids}")
-            print(f"  Project: {len(project_measures)} measures, {len(S.tracks)} tracks")
         
         measures_to_generate, extra_id_to_measure, extra_id_to_track = detect_measures_to_generate(
-            S, s, start_measure, end_measure, bool(extra_ids), debug=DEBUG
+            sections, start_measure, end_measure, bool(extra_ids), debug=DEBUG
         )
         
+        # nothing to infill: answer before loading the model or hashing and decoding S
         if not measures_to_generate:
             if DEBUG:
                 print("  No measures to generate")
             return f";<extra_id_{actual_extra_id}>"
         
-        with tempfile.NamedTemporaryFile(suffix='.mid', delete=False) as tmp:
-            temp_midi_path = tmp.name
-        temp_midi_path = '/Users/griffinpage/Documents/GitHub/midigpt-REAPER/test_in.mid'
-        S.dump(filename=temp_midi_path)
+        if not ensure_mmm_initialized():
+            if DEBUG:
+                print("  MMM not available, returning fallback")
+            return FALLBACK_CA
+        
+        cache_key = result_cache_key(s, S, use_sampling, temperature, model_dim, sampling_seed,
+                                     start_measure, end_measure)
+        # an identical deterministic request that is cached or still generating is answered once
+        cached = claim_cache_key(cache_key)
+        if cached is not None:
+            if DEBUG:
+                print("  Identical deterministic request, returning cached result")
+            # this call never claimed the key, so the finally below must not release another thread's claim
+            cache_key = None
+            return cached
         
-        if DEBUG:
-            print(f"  Created full project MIDI with {S.get_n_measures()} measures")
+        S = song_from_payload(S)
         
-        input_midi = mido.MidiFile(temp_midi_path)
-        input_ticks_per_beat = input_midi.ticks_per_beat
-        input_time_sig = (4, 4)
-        for track in input_midi.tracks:
-            for msg in track:
-                if msg.type == 'time_signature':
-                    input_time_sig = (msg.numerator, msg.denominator)
-                    break
+        n_project_measures = S.get_n_measures()
         
-        score_obj = Score(temp_midi_path)
+        if DEBUG:
+            print(f"  Project: {n_project_measures} measures, {len(S.tracks)} tracks")
         
-        context_length = model_dim
+        temp_midi_path = acquire_temp_midi_path()
+        try:
+            S.dump(filename=temp_midi_path)
+            score_obj = Score(temp_midi_path)
+        finally:
+            # Score has read the file, so the path is free for the next request
+            release_temp_midi_path(temp_midi_path)
         
         if DEBUG:
-            print(f"\n=== BUILDING PROMPT CONFIG ===")
-            print(f"  REAPER selection: measures {start_measure}-{end_measure}")
-            print(f"  Total measures in score: {len(project_measures)}")
-            print(f"  Context length: {context_length} bars (on each side of target)")
-            print(f"  Measures to infill: {sorted(measures_to_generate)}")
-        
-        # Build track-specific bar mode
-        bar_mode = build_track_specific_bar_mode(
-            S, measures_to_generate, extra_id_to_measure, extra_id_to_track, debug=DEBUG
-        )
+            print(f"  Created full project MIDI with {S.get_n_measures()} measures")
         
-        if not bar_mode["bars"]:
-            if DEBUG:
-                print("  No tracks need infilling, using empty config")
-            prompt_cfg = PromptConfig({}, context_length=context_length)
-        else:
-            if DEBUG:
-                print(f"  Total tracks in score: {len(S.tracks)}")
-                print(f"  Tracks configured for infilling: {len(bar_mode['bars'])}")
-                for track_idx, ranges in bar_mode["bars"].items():
-                    print(f"    Track {track_idx}: {ranges}")
-            
-            prompt_cfg = PromptConfig(bar_mode, context_length=context_length)
-        
-        gen_cfg = GenerationConfig(
-            do_sample=use_sampling,
-            max_new_tokens=256,
-            attempts=4,
-            pad_token_id=0,
-            repetition_penalty=1.0,
-            temperature=temperature,
-            top_k=50,
-            top_p=1.0,
+        input_ticks_per_beat, input_time_sig = get_dumped_midi_header(S)
+        
+        prompt_cfg = build_prompt_config(
+            S, measures_to_generate, extra_id_to_measure, extra_id_to_track, model_dim,
+            start_measure, end_measure
         )
         
-        engine = SamplingEngine(gen_cfg, TOKENIZER, seed=sampling_seed, verbose=DEBUG)
+        generated_score = generate_score(score_obj, prompt_cfg, use_sampling, temperature, sampling_seed)
         
-        if DEBUG:
-            print(f"\n=== MMM GENERATION ===")
-            print(f"  Tracks: {len(S.tracks)}")
-            print(f"  Generating measures: {sorted(measures_to_generate)}")
-            print(f"  Context length: {prompt_cfg.context_length} bars")
-            print(f"  Temperature: {temperature}")
-            print(f"  Max tokens: {gen_cfg.max_new_tokens}")
-            print(f"  PromptConfig:")
-            print(f"    Mode: {'BarInfilling' if prompt_cfg.bar_infilling() else 'Other'}")
-            print(f"    Empty: {prompt_cfg.empty()}")
-            if prompt_cfg.bar_infilling() and not prompt_cfg.empty():
-                bars_dict = prompt_cfg.bars()
-                print(f"    Tracks configured: {len(bars_dict)}")
-                for track_idx, ranges in bars_dict.items():
-                    print(f"      Track {track_idx}: {ranges}")
+        result_midi_path = acquire_temp_midi_path()
         
         try:
-            generated_score = generate(
-                model=MODEL,
-                tokenizer=TOKENIZER,
-                prompt_config=prompt_cfg,
-                sampling_engine=engine,
-                score=score_obj,
-                verbose=bool(DEBUG)
+            ca_result = generated_score_to_ca(
+                generated_score,
+                result_midi_path,
+                n_project_measures,
+                measures_to_generate,
+                extra_id_to_measure,
+                input_ticks_per_beat,
+                input_time_sig
             )
-        except Exception as gen_error:
-            if DEBUG:
-                print(f"\n=== GENERATION ERROR ===")
-                print(f"  Error: {gen_error}")
-                import traceback
-                traceback.print_exc()
-            raise
+        finally:
+            release_temp_midi_path(result_midi_path)
         
-        with tempfile.NamedTemporaryFile(suffix='.mid', delete=False) as tmp:
-            result_midi_path = tmp.name
-        result_midi_path = '/Users/griffinpage/Documents/GitHub/midigpt-REAPER/test_out.mid'
+        store_result(cache_key, ca_result)
         
-        try:
-            generated_score.save(result_midi_path)
-        except Exception as save_error:
-            if DEBUG:
-                print(f"  Error saving score: {save_error}")
-            raise
+        if DEBUG:
+            print(f"\n=== RESULT ===")
+            print(f"  CA format: {len(ca_result)} chars")
+            print(f"  Preview: {ca_result[:200]}...")
         
-        if not os.path.exists(result_midi_path):
-            if DEBUG:
-                print(f"  ERROR: Generated MIDI file does not exist")
-            raise FileNotFoundError("Generated MIDI file not created")
+        return ca_result
         
-        file_size = os.path.getsize(result_midi_path)
-        if file_size == 0:
-            if DEBUG:
-                print(f"  ERROR: Generated MIDI file is empty")
-            raise ValueError("Generated MIDI file is empty")
+    except Exception as e:
+        if DEBUG:
+            print(f'\nError: {e}')
+            import traceback
+            traceback.print_exc()
         
+        if 'actual_extra_id' in locals():
+            return FALLBACK_CA_TEMPLATE.format(actual_extra_id)
+        return FALLBACK_CA
+    
+    finally:
+        release_cache_key(cache_key)
+
+
+def call_nn_infill_batch(s, S, n_variants, use_sampling=True, options_dict=None, start_measure=None,
+                         end_measure=None):
+    """
+    Generate n_variants infills for the same request and return them as a list of CA strings.
+    
+    The project MIDI, Score and PromptConfig are built once and shared by every variant.
+    Each generated score is converted on IO_POOL while the next variant samples.
+    """
+    temperature, model_dim, max_steps, shuffle, sampling_seed = read_infill_options(options_dict)
+    n_variants = max(1, int(n_variants))
+    
+    extra_ids, sections = scan_ca_structure(s)
+    actual_extra_id = extra_ids[0] if extra_ids else 0
+    fallback = FALLBACK_CA_TEMPLATE.format(actual_extra_id)
+    
+    if DEBUG:
+        print(f"\n{'='*60}")
+        print('MMM CALL_NN_INFILL_BATCH')
+        print(f"  Variants: {n_variants}")
+        print(f"  Temperature: {temperature}")
+    
+    if not MMM_AVAILABLE:
         if DEBUG:
-            print(f"  Generation complete, saved to {result_midi_path}")
-            print(f"  File size: {file_size} bytes")
-        
-        ca_result = convert_midi_to_ca_format_with_timing(
-            result_midi_path,
-            project_measures,
-            measures_to_generate,
-            extra_id_to_measure,
-            input_ticks_per_beat=input_ticks_per_beat,
-            input_time_signature=input_time_sig
-        )
+            print("  MMM not available, returning fallback")
+        return [fallback] * n_variants
+    
+    measures_to_generate, extra_id_to_measure, extra_id_to_track = detect_measures_to_generate(
+        sections, start_measure, end_measure, bool(extra_ids), debug=DEBUG
+    )
+    
+    # nothing to infill: answer before loading the model or decoding S
+    if not measures_to_generate:
+        return [f";<extra_id_{actual_extra_id}>"] * n_variants
+    
+    if not ensure_mmm_initialized():
+        if DEBUG:
+            print("  MMM not available, returning fallback")
+        return [fallback] * n_variants
+    
+    result_midi_paths = []
+    futures = []
+    try:
+        S = song_from_payload(S)
+        
+        n_project_measures = S.get_n_measures()
         
+        temp_midi_path = acquire_temp_midi_path()
         try:
-            #os.unlink(temp_midi_path)
-            #os.unlink(result_midi_path)
-            pass
-        except:
-            pass
+            S.dump(filename=temp_midi_path)
+            score_obj = Score(temp_midi_path)
+        finally:
+            release_temp_midi_path(temp_midi_path)
         
-        LAST_CALL = s_normalized
-        LAST_OUTPUTS.add(ca_result)
+        input_ticks_per_beat, input_time_sig = get_dumped_midi_header(S)
         
-        if DEBUG:
-            print(f"\n=== RESULT ===")
-            print(f"  CA format: {len(ca_result)} chars")
-            print(f"  Preview: {ca_result[:200]}...")
+        prompt_cfg = build_prompt_config(
+            S, measures_to_generate, extra_id_to_measure, extra_id_to_track, model_dim,
+            start_measure, end_measure
+        )
         
-        return ca_result
+        for variant_idx in range(n_variants):
+            # keep seeded runs reproducible while still giving each variant its own stream
+            seed = sampling_seed + variant_idx if sampling_seed >= 0 else sampling_seed
+            generated_score = generate_score(score_obj, prompt_cfg, use_sampling, temperature, seed)
+            
+            result_midi_path = acquire_temp_midi_path()
+            result_midi_paths.append(result_midi_path)
+            
+            futures.append(IO_POOL.submit(
+                generated_score_to_ca, generated_score, result_midi_path, n_project_measures,
+                measures_to_generate, extra_id_to_measure, input_ticks_per_beat, input_time_sig
+            ))
         
+        results = [future.result() for future in futures]
+        return results
+    
     except Exception as e:
         if DEBUG:
             print(f'\nError: {e}')
             import traceback
             traceback.print_exc()
-        
-        fallback_extra_id = actual_extra_id if 'actual_extra_id' in locals() else 0
-        return f";M:0;B:5;L:96;<extra_id_{fallback_extra_id}>N:60;d:240;w:240"
+        return [fallback] * n_variants
+    
+    finally:
+        # a variant that failed early must not hand out paths the others are still writing
+        wait_futures(futures)
+        for result_midi_path in result_midi_paths:
+            release_temp_midi_path(result_midi_path)
+
+
+def clear_result_cache():
+    """Drop every cached infill result, e.g. after swapping model files; returns how many were dropped"""
+    with RESULT_CACHE_LOCK:
+        n_dropped = len(RESULT_CACHE)
+        RESULT_CACHE.clear()
+    if DEBUG:
+        print(f"  Cleared {n_dropped} cached results")
+    return n_dropped
+
+
+# both transports dispatch to these; GENERATION_LOCK keeps the shared model single-threaded
+RPC_METHODS = {
+    'call_nn_infill': call_nn_infill,
+    'call_nn_infill_batch': call_nn_infill_batch,
+    'clear_result_cache': clear_result_cache,
+}
+
+
+class KeepAliveXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+    # HTTP/1.1 keeps the connection open, so a client reusing its ServerProxy skips the TCP setup per call
+    protocol_version = 'HTTP/1.1'
+
+
+class ThreadingXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+    
+    def _dispatch(self, method, params):
+        # connection threads stay unbounded so idle keep-alive clients never block others; the work is bounded
+        with ACTIVE_REQUESTS:
+            return super()._dispatch(method, params)
+
+
+class MsgpackRPCHandler(socketserver.StreamRequestHandler):
+    """
+    Binary alternative to the XMLRPC endpoint for clients that can use msgpack.
+    Every frame is a 4-byte big-endian length followed by a msgpack body.
+    Requests are [method_name, args] and replies are [error_or_None, result].
+    S is sent as its save dict packed into one msgpack bin, so the server can hash
+    those bytes for RESULT_CACHE without re-serializing the decoded dict.
+    """
+    def handle(self):
+        while True:
+            header = self.rfile.read(4)
+            if len(header) < 4:
+                return
+            (length,) = struct.unpack('>I', header)
+            method_name, args = msgpack.unpackb(self.rfile.read(length), raw=False)
+            
+            try:
+                with ACTIVE_REQUESTS:
+                    reply = [None, RPC_METHODS[method_name](*args)]
+            except Exception as e:
+                reply = [f'{type(e).__name__}: {e}', None]
+            
+            body = msgpack.packb(reply, use_bin_type=True)
+            self.wfile.write(struct.pack('>I', len(body)) + body)
+
+
+def start_msgpack_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', MSGPACK_PORT), MsgpackRPCHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
 
 
 def start_server():
@@ -579,11 +1073,17 @@ def start_server():
     print("MMM Server")
     print("="*60)
     print(f"Port: {PORT}")
+    print(f"Msgpack port: {MSGPACK_PORT if MSGPACK_AVAILABLE else 'disabled (msgpack not installed)'}")
     print(f"MMM: {MMM_AVAILABLE}")
     print("="*60)
     
-    server = SimpleXMLRPCServer(('127.0.0.1', PORT), logRequests=DEBUG, allow_none=True)
-    server.register_function(call_nn_infill, 'call_nn_infill')
+    server = ThreadingXMLRPCServer(('127.0.0.1', PORT), requestHandler=KeepAliveXMLRPCRequestHandler,
+                                    logRequests=DEBUG, allow_none=True)
+    for name, fn in RPC_METHODS.items():
+        server.register_function(fn, name)
+    
+    if MSGPACK_AVAILABLE:
+        start_msgpack_server()
     
     print(f"\nServer ready on port {PORT}")
     print("\nPress Ctrl+C to stop\n")
@@ -596,8 +1096,11 @@ def start_server():
 
 if __name__ == "__main__":
     if MMM_AVAILABLE:
-        success = initialize_mmm()
-        if not success:
+        if not ensure_mmm_initialized():
             print("Warning: MMM initialization failed, server will use fallback responses")
+        elif os.environ.get('MMM_WARMUP') != '0':
+            # set MMM_WARMUP=0 to start serving without the warm-up generation
+            print("Warming up MMM...")
+            warm_up_mmm()
     
     start_server()
\ No newline at end of file
@@ -1,6 +1,13 @@
 import collections
+import re
 import encoding_functions as enc
 
+# a segment that parse_single_instruction returns unchanged: X:digits, /N:digits, <...>, or empty
+_WELL_FORMED_SEGMENT = r'(?:(?:[MLBIRwdpDN]|/N):\d+|<[^;]*)?'
+_WELL_FORMED_INSTRUCTION_STR_RE = re.compile(_WELL_FORMED_SEGMENT + r'(?:;' + _WELL_FORMED_SEGMENT + r')*')
+_INSTRUCTION_RE = re.compile(r'(?:[MLBIRwdpDN]|/N):\d+|<[^;]*')
+_EXTRA_ID_RE = re.compile(r';<extra_id_[^>]*>')
+
 
 def parse_single_instruction(s: str, allow_NXY=False) -> str:
     """s a string, output from a neural net, intended to be a midi-like instruction.
@@ -56,6 +63,10 @@ def parse_single_instruction(s: str, allow_NXY=False) -> str:
 def parse_instruction_str(s: str) -> "list[str]":
     """s a string, output from a neural net, intended to be a list of midi-like instructions where each is preceded
     by ;"""
+    # neural net output is normally all well-formed instructions; then one regex scan tokenizes it
+    if _WELL_FORMED_INSTRUCTION_STR_RE.fullmatch(s):
+        return _INSTRUCTION_RE.findall(s)
+
     s_split = s.split(';')
     res = []
     for instruction in s_split:
@@ -93,13 +104,9 @@ def extract_extra_ids(s: str, L=None) -> "list[str]":
     """call this with L=None"""
     if L is None:
         L = []
-    first_loc = s.find(';<extra_id_')
-    if first_loc != -1:
-        second_loc = s.find('>', first_loc)
-        L.append(s[first_loc: second_loc + 1])
-        return extract_extra_ids(s[second_loc + 1:], L)
-    else:
-        return L
+    # one scan, rather than re-slicing the rest of s after every match
+    L.extend(_EXTRA_ID_RE.findall(s))
+    return L
 
 
 def infos_by_extra_id(s: str = "") -> "dict[str, dict[str]]":
@@ -151,8 +158,7 @@ def infos_by_extra_id(s: str = "") -> "dict[str, dict[str]]":
             user_commands = user_commands.split(';')
             if len(user_commands) > 0:
                 user_commands = user_commands[1:]
-            while instruction in user_commands:
-                user_commands.pop(user_commands.index(instruction))
+            user_commands = [c for c in user_commands if c != instruction]
 
             cur_res["user_commands"] = user_commands
             res[instruction] = cur_res
@@ -1,5 +1,4 @@
 import copy
-import json
 import math
 import pickle
 import random
@@ -239,23 +238,6 @@ def val_test_infill_encode(S: ms.MidiSongByMeasure,
                                                    commands_at_end=commands_at_end)
 
 
-def is_good_for_val_test_infill_old(input_ids: "str", labels: "str", n_measures: "int"):
-    raise NotImplemented("need a better test now that there can be N's in conditioning")
-    n_measures_with_notes_in_example = 0  # masked and unmasked notes both count
-    m_split = input_ids.split(';M')
-    for s in m_split:
-        if ';N:' in s or ';D:' in s or ';<extra_id' in s:
-            n_measures_with_notes_in_example += 1
-
-    # 4 and 8 measure examples require note onsets in all measures.
-    # 16 measure examples require note onsets in all but 1 measure.
-    # 32 measure examples require note onsets in all but 2 measures.
-    if n_measures_with_notes_in_example >= n_measures - n_measures//16:
-        return True
-
-    return False
-
-
 # test written
 def aug_bpm(S: "ms.MidiSongByMeasure"):
     """in place operation"""
@@ -708,8 +690,7 @@ def build_val_test_finetune_data_infill(tokenizer, epoch, pool, mode,
 
     for folder, _, fnames in os.walk(path):
         for fname in fnames:
-            with open(os.path.join(folder, fname)) as infile:
-                d = json.load(infile)
+            d = pre.load_json(os.path.join(folder, fname))
             d_keys = sorted(list(d.keys()))
             items = [(i, k, d[k], tokenizer, epoch, mask_pattern_type, n_measures) for i, k in enumerate(d_keys)]
             print('file {} loaded'.format(fname))
@@ -731,11 +712,9 @@ def build_val_test_finetune_data_infill(tokenizer, epoch, pool, mode,
     os.makedirs(target_dir, exist_ok=True)
 
     if mode == 'val':
-        with open(os.path.join(target_dir, 'finetune_validation_{}_{}.txt'.format(mask_pattern_type, n_measures)), 'w') as outfile:
-            json.dump(dict_to_write, outfile)
+        pre.dump_json(dict_to_write, os.path.join(target_dir, 'finetune_validation_{}_{}.txt'.format(mask_pattern_type, n_measures)))
     elif mode == 'test':
-        with open(os.path.join(target_dir, 'finetune_test_{}_{}.txt'.format(mask_pattern_type, n_measures)), 'w') as outfile:
-            json.dump(dict_to_write, outfile)
+        pre.dump_json(dict_to_write, os.path.join(target_dir, 'finetune_test_{}_{}.txt'.format(mask_pattern_type, n_measures)))
     to_print = 'finished building {} data ('.format(mode)
     to_print += 'mask_pattern_type={}'.format(mask_pattern_type)
     to_print += ', n_measures={})'.format(n_measures)
@@ -1243,8 +1222,7 @@ def build_finetune_train_data(tokenizer, epoch, pool, path, force_n_measures: bo
 
     for folder, _, fnames in os.walk(path):
         for fname in fnames:
-            with open(os.path.join(folder, fname)) as infile:
-                d = json.load(infile)
+            d = pre.load_json(os.path.join(folder, fname))
             d_keys = sorted(list(d.keys()))
             items = [(i, k, d[k], tokenizer, epoch, force_n_measures) for i, k in enumerate(d_keys)]
             print('file {} loaded'.format(fname))
@@ -1339,8 +1317,7 @@ def build_pretrain_data(tokenizer, epoch, pool, mode):
 
     for folder, _, fnames in os.walk(path):
         for fname in fnames:
-            with open(os.path.join(folder, fname)) as infile:
-                d = json.load(infile)
+            d = pre.load_json(os.path.join(folder, fname))
             d_keys = sorted(list(d.keys()))
             items = [(i, k, d[k], tokenizer, epoch, target_len) for i, k in enumerate(d_keys)]
             print('file {} loaded'.format(fname))
@@ -1524,18 +1501,6 @@ class FineTuneTrainDataset:
         for x in self.data:
             yield x
 
-    def random_subset_of_size(self, size):
-        raise NotImplemented
-        # what follows is old code from before we did data subsetting based on size
-        if size >= len(self):
-            return self
-        indexes = set()
-        while len(indexes) < size:
-            indexes.add(random.randint(0, len(self) - 1))
-        indexes = sorted(list(indexes))
-        res = torch.utils.data.Subset(self, indexes)
-        return res
-
 
 class FineTuneValTestDatasetInfill(torch.utils.data.Dataset):
     def __init__(self, mode, mask_pattern_type, n_measures):
@@ -1564,8 +1529,7 @@ class FineTuneValTestDatasetInfill(torch.utils.data.Dataset):
         if not os.path.exists(path):
             raise ValueError('No data file named {} found. Did you run build_val_and_test_finetune_data_infill.py?'.format(s))
 
-        with open(path) as infile:
-            d = json.load(infile)
+        d = pre.load_json(path)
         for k in sorted([int(x) for x in d]):
             this_example = d[str(k)]
             self.data.append(this_example)
@@ -3,7 +3,6 @@ import os
 import time
 import constants
 import preprocessing_functions as pre
-import json
 
 
 # LMD takes about 9.5 hours on 4 cores at home
@@ -51,8 +50,7 @@ if __name__ == '__main__':
                     print(i + 1, 'files in chunk {} done so far'.format(cur_chunk))
 
             print('saving chunk {}'.format(cur_chunk))
-            with open(os.path.join(out_folder, '{}.txt'.format(cur_chunk)), 'w') as outfile:
-                json.dump(cur_dump_dict, outfile)
+            pre.dump_json(cur_dump_dict, os.path.join(out_folder, '{}.txt'.format(cur_chunk)))
 
             cur_chunk += 1
 
@@ -2,6 +2,13 @@ import constants
 import midisong as ms
 import collections
 import copy
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 
 # test written
@@ -274,6 +281,25 @@ def midisongbymeasure_from_save_dict(d: dict) -> ms.MidiSongByMeasure:
     return ms.MidiSongByMeasure(tracks=tracks, measure_endpoints=d['MEs'], tempo_changes=tempo_changes, cpq=d['cpq'])
 
 
+def load_json(path):
+    """json.load, through orjson when it is installed; preprocessed MIDI files are large"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as infile:
+            return orjson.loads(infile.read())
+    with open(path, encoding='utf-8') as infile:
+        return json.load(infile)
+
+
+def dump_json(d, path):
+    """json.dump, through orjson when it is installed. Non-str keys are written as strings, as json does"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'wb') as outfile:
+            outfile.write(orjson.dumps(d, option=orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, 'w', encoding='utf-8') as outfile:
+            json.dump(d, outfile)
+
+
 # for parallel processing purposes
 def preprocess_midi_to_save_dict(p, quantize=None):
     """p a path"""
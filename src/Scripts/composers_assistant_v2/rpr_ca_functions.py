@@ -1054,9 +1054,9 @@ def create_and_write_variation_for_time_selection(n_cycles=2, mask_pattern_type=
             if PERMUTE_MASKS:
                 masks = random.sample(masks, len(masks))  # random permutation
             masks_list.append(masks)
-            for x in masks:
-                i = act_L.index(x)
-                act_L.pop(i)
+            # act_L holds unique (track, measure) pairs, so one filtering pass removes these masks
+            masked = set(masks)
+            act_L = [T for T in act_L if T not in masked]
 
     elif mask_pattern_type == 1:  # random measures
         measures = sorted(list(set(T[1] for T in act_L)))
@@ -1085,12 +1085,9 @@ def create_and_write_variation_for_time_selection(n_cycles=2, mask_pattern_type=
             else:
                 masks_list.append(masks)
 
-            for x in masks:
-                i = act_L.index(x)
-                act_L.pop(i)
-            for x in masked_measures:
-                i = measures.index(x)
-                measures.pop(i)
+            masked = set(masks)
+            act_L = [T for T in act_L if T not in masked]
+            measures = [x for x in measures if x not in masked_measures]
 
     elif mask_pattern_type == 2:  # random instruments
         tracks = sorted(list(set(T[0] for T in act_L)))
@@ -1117,12 +1114,9 @@ def create_and_write_variation_for_time_selection(n_cycles=2, mask_pattern_type=
             else:
                 masks_list.append(masks)
 
-            for x in masks:
-                i = act_L.index(x)
-                act_L.pop(i)
-            for x in masked_tracks:
-                i = tracks.index(x)
-                tracks.pop(i)
+            masked = set(masks)
+            act_L = [T for T in act_L if T not in masked]
+            tracks = [x for x in tracks if x not in masked_tracks]
 
     else:
         raise ValueError('mask_pattern_type {} not recognized.'.format(mask_pattern_type))
@@ -3,35 +3,42 @@ REAPER Functions for MMM Integration
 Handles parameter reading and server communication
 """
 
-import sys
-import os
+import json
+import socket
+import struct
+import time
+import xmlrpc.client
 
 import mytrackviewstuff as mt
-import mymidistuff as mm
 import myfunctions as mf
-import midisong as ms
-import nn_str_functions as nns
-import constants as cs
-import encoding_functions as enc
-import tokenizer_functions as tok
 import preprocessing_functions as pre
-import midi_inst_to_name
 
 GLOBAL_FX_ID = 54964318
 TRACK_FX_ID = 349583025
-DEBUG = True
-
-script_path = os.path.dirname(os.path.realpath(__file__))
-ca_path = os.path.join(script_path, 'src', 'Scripts', 'composers_assistant_v2')
-if os.path.exists(ca_path):
-    sys.path.insert(0, os.path.abspath(ca_path))
+# set True to echo options and requests to the REAPER console
+DEBUG = False
+MMM_SERVER_PORT = 3456
+MMM_MSGPACK_PORT = 3457
+# after the msgpack endpoint fails, calls use XML-RPC for this many seconds before trying it again
+MSGPACK_RETRY_SECONDS = 30
 
 try:
     from reaper_python import *
-    import preprocessing_functions as pre
 except ImportError as e:
     print(f"Warning: Could not import REAPER modules: {e}")
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
 def _locate_infiller_global_options_FX_loc() -> int:
     """-1 means not found (or not enabled). Look on monitor FX. Get the first enabled instance."""
     from reaper_python import RPR_GetMasterTrack, RPR_TrackFX_GetEnabled, RPR_TrackFX_GetParam
@@ -105,24 +112,28 @@ def get_global_options():
         # Parameter 0 = slider1 (jsfx_id), so use loc_offset=1 to skip it
         loc_offset = 1
         
-        print(f"Reading parameters from FX at index {fx_loc} with loc_offset={loc_offset}")
+        if DEBUG:
+            print(f"Reading parameters from FX at index {fx_loc} with loc_offset={loc_offset}")
         
         # Core generation parameters - REAPER returns actual slider values, no scaling needed!
         # slider10-20 map to parameters 1-11
         val, _, _, _, _, _ = RPR_TrackFX_GetParam(master, fx_loc, 0 + loc_offset, 0, 0)
         options.temperature = val
-        print(f"  Temperature: {options.temperature:.3f}")
+        if DEBUG:
+            print(f"  Temperature: {options.temperature:.3f}")
         
         val, _, _, _, _, _ = RPR_TrackFX_GetParam(master, fx_loc, 1 + loc_offset, 0, 0)
         options.tracks_per_step = int(val)
-        print(f"  Tracks per step: {options.tracks_per_step}")
+        if DEBUG:
+            print(f"  Tracks per step: {options.tracks_per_step}")
         
         val, _, _, _, _, _ = RPR_TrackFX_GetParam(master, fx_loc, 2 + loc_offset, 0, 0)
         options.bars_per_step = int(val)
         
         val, _, _, _, _, _ = RPR_TrackFX_GetParam(master, fx_loc, 3 + loc_offset, 0, 0)
         options.model_dim = int(val)
-        print(f"  Model dim: {options.model_dim}")
+        if DEBUG:
+            print(f"  Model dim: {options.model_dim}")
         
         val, _, _, _, _, _ = RPR_TrackFX_GetParam(master, fx_loc, 4 + loc_offset, 0, 0)
         options.percentage = int(val)
@@ -295,20 +306,96 @@ def convert_track_options_to_control_strings(opts: MMMTrackOptionsObj) -> list:
     return controls
 
 
+def encode_song_payload(S):
+    """
+    Pack S for the MMM server as a single xmlrpc Binary holding its JSON save dict.
+    XMLRPC marshals a nested dict of thousands of notes as <struct>/<string> elements,
+    which is several times slower to build and parse than one base64 blob.
+    """
+    d = pre.encode_midisongbymeasure_to_save_dict(S)
+    data = orjson.dumps(d) if ORJSON_AVAILABLE else json.dumps(d).encode('utf-8')
+    return xmlrpc.client.Binary(data)
+
+
+_MMM_PROXY = None
+
+
+def _mmm_proxy():
+    """
+    One ServerProxy per process. Its transport keeps the HTTP/1.1 connection to the MMM server open
+    between calls and reconnects by itself if the server was restarted.
+    """
+    global _MMM_PROXY
+    if _MMM_PROXY is None:
+        _MMM_PROXY = xmlrpc.client.ServerProxy(f'http://127.0.0.1:{MMM_SERVER_PORT}')
+    return _MMM_PROXY
+
+
+_MSGPACK_CONNECTION = None
+# time.monotonic() before which calls skip the msgpack endpoint, set when it last failed
+_MSGPACK_RETRY_AT = 0.0
+
+
+def _msgpack_connection():
+    """(socket, reader) for the MMM msgpack endpoint, opened on first use and kept for later calls"""
+    global _MSGPACK_CONNECTION
+    if _MSGPACK_CONNECTION is None:
+        sock = socket.create_connection(('127.0.0.1', MMM_MSGPACK_PORT))
+        _MSGPACK_CONNECTION = (sock, sock.makefile('rb'))
+    return _MSGPACK_CONNECTION
+
+
+def _close_msgpack_connection():
+    global _MSGPACK_CONNECTION
+    if _MSGPACK_CONNECTION is not None:
+        sock, reader = _MSGPACK_CONNECTION
+        _MSGPACK_CONNECTION = None
+        reader.close()
+        sock.close()
+
+
+def _call_msgpack(method_name, args):
+    """
+    Call the MMM server's msgpack endpoint: a 4-byte big-endian length, then [method_name, args].
+    The server answers any number of frames per connection, so one connection is reused across calls.
+    Server-side errors are raised as xmlrpc Faults so callers handle both transports alike.
+    """
+    body = msgpack.packb([method_name, args], use_bin_type=True)
+    frame = struct.pack('>I', len(body)) + body
+    while True:
+        reused = _MSGPACK_CONNECTION is not None
+        sock, reader = _msgpack_connection()
+        try:
+            sock.sendall(frame)
+            header = reader.read(4)
+            if len(header) < 4:
+                raise ConnectionError('MMM msgpack server closed the connection')
+            (length,) = struct.unpack('>I', header)
+            err, result = msgpack.unpackb(reader.read(length), raw=False)
+            break
+        except OSError:
+            _close_msgpack_connection()
+            # a kept connection goes stale when the server restarts; retry once on a fresh one
+            if not reused:
+                raise
+    
+    if err is not None:
+        raise xmlrpc.client.Fault(1, err)
+    return result
+
+
 def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_size=0, 
                    has_fully_masked_inst=False, temperature=1.0, start_measure=None, end_measure=None):
     """
-    Call the MMM server via XML-RPC
+    Call the MMM server, over its msgpack endpoint when msgpack is installed and via XML-RPC otherwise
     Uses parameters passed to function, supplementing with global options for MMM-specific params
     """
-    from xmlrpc.client import ServerProxy
-    import xmlrpc.client
+    global _MSGPACK_RETRY_AT
     
-    print(f"\ncall_nn_infill called with temperature={temperature}")
+    if DEBUG:
+        print(f"\ncall_nn_infill called with temperature={temperature}")
     
     try:
-        proxy = ServerProxy('http://127.0.0.1:3456')
-        
         # Read global options for MMM-specific parameters not in CA signature
         options = get_global_options()
 
@@ -331,11 +418,31 @@ def call_nn_infill(s, S, use_sampling=True, min_length=10, enc_no_repeat_ngram_s
             'track_options': track_options
         }
         
-        print(f"Sending to server: {options_dict}")
+        if DEBUG:
+            print(f"Sending to server: {options_dict}")
+        
+        if MSGPACK_AVAILABLE and time.monotonic() >= _MSGPACK_RETRY_AT:
+            # S goes as its save dict packed into one msgpack bin, with no XML or base64 layer,
+            # which the server can hash as received
+            msgpack_options = dict(options_dict, track_options={
+                str(i): vars(opts) for i, opts in track_options.items()
+            })
+            song_bytes = msgpack.packb(pre.encode_midisongbymeasure_to_save_dict(S), use_bin_type=True)
+            try:
+                return _call_msgpack('call_nn_infill', [
+                    s, song_bytes, use_sampling, min_length,
+                    enc_no_repeat_ngram_size, has_fully_masked_inst, msgpack_options,
+                    start_measure, end_measure
+                ])
+            except OSError:
+                # not started yet, an older server without the endpoint, or a dropped connection
+                _MSGPACK_RETRY_AT = time.monotonic() + MSGPACK_RETRY_SECONDS
+                if DEBUG:
+                    print('MMM msgpack endpoint not available, falling back to XML-RPC')
         
-        res = proxy.call_nn_infill(
+        res = _mmm_proxy().call_nn_infill(
             s, 
-            pre.encode_midisongbymeasure_to_save_dict(S), 
+            encode_song_payload(S), 
             use_sampling, 
             min_length, 
             enc_no_repeat_ngram_size, 
@@ -1,7 +1,7 @@
-import json
 import os.path
 import time
 import spm_train_functions as fn
+import preprocessing_functions as pre
 import constants as cs
 from multiprocessing import Pool
 import math
@@ -29,8 +29,7 @@ if __name__ == '__main__':
         for fname in fnames:
             print('loading file {}'.format(fname))
             t0 = time.time()
-            with open(os.path.join(path, fname)) as infile:
-                d = json.load(infile)
+            d = pre.load_json(os.path.join(path, fname))
             print('file loaded in {} sec'.format(time.time()-t0))
 
             inputs = [(d[p], n_examples_per_song_get, n_tries_per_song) for p in d]
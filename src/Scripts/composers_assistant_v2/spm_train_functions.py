@@ -1,6 +1,5 @@
 import copy
 import os
-import json
 import random
 
 import constants as cs
@@ -13,8 +12,7 @@ def get_song_count(path):
     song_count = 0
     for folder, _, fnames in os.walk(path):
         for fname in fnames:
-            with open(os.path.join(folder, fname)) as infile:
-                d = json.load(infile)
+            d = pre.load_json(os.path.join(folder, fname))
             song_count += len(d)
     return song_count
 